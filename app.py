@@ -8,12 +8,15 @@ import os
 import sys
 from pathlib import Path
 import logging
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 # Add src directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
+from src.chunk_batch import ChunkBatch
 from src.document_processor import DocumentProcessor
-from src.vector_db import VectorDatabase
+from src.vector_db import VectorDatabase, load_embedding_model, create_chroma_client
 from src.llm_client import OllamaClient
 
 # Configure logging
@@ -28,15 +31,34 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+
+@st.cache_resource
+def get_embedding_model():
+    """Load the embedding model once per process and share it across sessions"""
+    return load_embedding_model()
+
+
+@st.cache_resource
+def get_chroma_client(persist_directory: str = "./embeddings"):
+    """Create the ChromaDB client once per process and share it across sessions"""
+    return create_chroma_client(persist_directory)
+
+
 # Initialize session state
 if 'vector_db' not in st.session_state:
-    st.session_state.vector_db = VectorDatabase()
+    st.session_state.vector_db = VectorDatabase(
+        embedding_model=get_embedding_model(),
+        client=get_chroma_client()
+    )
+# The LLM client is per session since it holds the chat session and the
+# selected model; construction is cheap because the connection check is lazy
 if 'llm_client' not in st.session_state:
     st.session_state.llm_client = OllamaClient()
 if 'doc_processor' not in st.session_state:
     st.session_state.doc_processor = DocumentProcessor()
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
+    st.session_state.llm_client.reset_conversation()
 if 'project_name' not in st.session_state:
     st.session_state.project_name = "OpenSource Project"
 if 'project_description' not in st.session_state:
@@ -125,14 +147,15 @@ def main():
         
         # URL input
         st.subheader("🌐 Load from URL")
-        url = st.text_input(
-            "Documentation URL",
+        url_text = st.text_area(
+            "Documentation URLs",
             placeholder="https://github.com/user/repo/tree/main/docs",
-            help="URL to documentation (basic web scraping)"
+            help="One URL per line (basic web scraping)"
         )
+        urls = [line.strip() for line in url_text.splitlines() if line.strip()]
         
-        if url and st.button("Load from URL"):
-            process_url(url)
+        if urls and st.button("Load from URL"):
+            process_urls(urls)
         
         st.divider()
         
@@ -159,6 +182,7 @@ def main():
         # Clear database
         if st.button("🗑️ Clear All Documents", type="secondary"):
             if st.session_state.vector_db.clear_collection():
+                st.session_state.llm_client.reset_conversation()
                 st.success("All documents cleared!")
                 st.rerun()
     
@@ -191,7 +215,7 @@ def process_uploaded_files(uploaded_files):
             
             if documents:
                 # Chunk documents
-                all_chunks = []
+                all_chunks = ChunkBatch()
                 for doc in documents:
                     chunks = st.session_state.doc_processor.chunk_document(doc)
                     all_chunks.extend(chunks)
@@ -216,7 +240,7 @@ def process_directory(directory_path):
             
             if documents:
                 # Chunk documents
-                all_chunks = []
+                all_chunks = ChunkBatch()
                 for doc in documents:
                     chunks = st.session_state.doc_processor.chunk_document(doc)
                     all_chunks.extend(chunks)
@@ -233,22 +257,22 @@ def process_directory(directory_path):
             st.error(f"Error loading from directory: {str(e)}")
 
 
-def process_url(url):
-    """Process documentation from URL"""
-    with st.spinner(f"Loading documentation from {url}..."):
+def process_urls(urls):
+    """Process documentation from one or more URLs"""
+    with st.spinner(f"Loading documentation from {len(urls)} URL(s)..."):
         try:
-            documents = st.session_state.doc_processor.load_from_url(url)
+            documents = asyncio.run(st.session_state.doc_processor.load_from_urls(urls))
             
             if documents:
                 # Chunk documents
-                all_chunks = []
+                all_chunks = ChunkBatch()
                 for doc in documents:
                     chunks = st.session_state.doc_processor.chunk_document(doc)
                     all_chunks.extend(chunks)
                 
                 # Add to vector database
                 if st.session_state.vector_db.add_documents(all_chunks):
-                    st.success(f"Successfully loaded documentation from URL into {len(all_chunks)} chunks!")
+                    st.success(f"Successfully loaded {len(documents)} pages into {len(all_chunks)} chunks!")
                 else:
                     st.error("Failed to add documents to vector database")
             else:
@@ -262,25 +286,31 @@ def handle_query(query):
     """Handle user query and generate response"""
     with st.spinner("Generating response..."):
         try:
-            # Search for relevant context
+            vector_db = st.session_state.vector_db
+            llm_client = st.session_state.llm_client
+            
+            # Search for relevant context while the LLM loads in the background
             context = []
-            if not st.session_state.vector_db.is_empty():
-                context = st.session_state.vector_db.search(query, n_results=5)
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                warm_up = pool.submit(llm_client.warm_up)
+                if not vector_db.is_empty():
+                    context = vector_db.search(query, n_results=5)
+                warm_up.result()
             
-            # Generate response
-            response = st.session_state.llm_client.generate_response(
-                question=query,
-                context=context,
-                project_name=st.session_state.project_name,
-                project_description=st.session_state.project_description
+            # Show the latest interaction, streaming the answer as it is generated
+            st.markdown(f"**You:** {query}")
+            st.markdown("**Assistant:**")
+            response = st.write_stream(
+                llm_client.generate_response_stream(
+                    question=query,
+                    context=context,
+                    project_name=st.session_state.project_name,
+                    project_description=st.session_state.project_description
+                )
             )
             
             # Add to chat history
-            st.session_state.chat_history.append((query, response))
-            
-            # Show the latest interaction
-            st.markdown(f"**You:** {query}")
-            st.markdown(f"**Assistant:** {response}")
+            st.session_state.chat_history.append((query, response.strip()))
             
             # Show context information if available
             if context:
@@ -0,0 +1,30 @@
+"""
+Chunk Batch Module
+Container for document chunks shared by the processor and the vector database
+"""
+
+from typing import List
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ChunkBatch:
+    """Document chunks stored as parallel lists (one entry per chunk)"""
+    texts: List[str] = field(default_factory=list)
+    sources: List[str] = field(default_factory=list)
+    types: List[str] = field(default_factory=list)
+    chunk_ids: List[int] = field(default_factory=list)
+    start_pos: List[int] = field(default_factory=list)
+    end_pos: List[int] = field(default_factory=list)
+    
+    def __len__(self) -> int:
+        return len(self.texts)
+    
+    def extend(self, other: 'ChunkBatch'):
+        """Append all chunks from another batch"""
+        self.texts.extend(other.texts)
+        self.sources.extend(other.sources)
+        self.types.extend(other.types)
+        self.chunk_ids.extend(other.chunk_ids)
+        self.start_pos.extend(other.start_pos)
+        self.end_pos.extend(other.end_pos)
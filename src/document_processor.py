@@ -4,12 +4,20 @@ Handles loading and processing of various document formats
 """
 
 import os
+import re
+import mmap
+import asyncio
 import logging
 from typing import List, Dict, Any
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
 import requests
 from bs4 import BeautifulSoup
 
+from .chunk_batch import ChunkBatch
+
 try:
     import PyPDF2
 except ImportError:
@@ -20,9 +28,42 @@ try:
 except ImportError:
     DocxDocument = None
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+WHITESPACE_RE = re.compile(r'\s+')
+
+# Text files above this size are read through mmap
+MMAP_THRESHOLD = 1024 * 1024
+
+# Shared session so repeated URL loads reuse connections
+http_session = requests.Session()
+
+# Maximum number of concurrent downloads in load_from_urls
+MAX_CONCURRENT_FETCHES = 10
+
+
+def _load_workers() -> int:
+    """Number of worker processes used for directory loading"""
+    env_workers = os.environ.get('DOCHELPER_LOAD_THREADS')
+    if env_workers:
+        try:
+            return max(1, int(env_workers))
+        except ValueError:
+            logger.warning(f"Invalid DOCHELPER_LOAD_THREADS value: {env_workers}")
+    return max(1, (os.cpu_count() or 2) - 1)
+
 
 class DocumentProcessor:
     """Processes documents from various sources and formats"""
@@ -39,44 +80,71 @@ class DocumentProcessor:
             logger.error(f"Directory {directory_path} does not exist")
             return documents
             
-        for file_path in directory.rglob('*'):
-            if file_path.is_file() and file_path.suffix.lower() in self.supported_extensions:
-                try:
-                    content = self._process_file(file_path)
-                    if content:
-                        documents.append({
-                            'content': content,
-                            'source': str(file_path),
-                            'type': file_path.suffix.lower()
-                        })
-                        logger.info(f"Processed {file_path}")
-                except Exception as e:
-                    logger.error(f"Error processing {file_path}: {str(e)}")
+        file_paths = [
+            file_path for file_path in directory.rglob('*')
+            if file_path.is_file() and file_path.suffix.lower() in self.supported_extensions
+        ]
+        
+        # Extract file contents in parallel (PDF parsing is CPU-bound)
+        workers = min(_load_workers(), len(file_paths))
+        if workers > 1:
+            contents = self._process_files_parallel(file_paths, workers)
+        else:
+            contents = [self._process_file_safely(file_path) for file_path in file_paths]
+        
+        for file_path, content in zip(file_paths, contents):
+            if content:
+                documents.append({
+                    'content': content,
+                    'source': str(file_path),
+                    'type': file_path.suffix.lower()
+                })
+                logger.info(f"Processed {file_path}")
                     
         return documents
     
+    def _process_file_safely(self, file_path: Path) -> str:
+        """Process a file in this process, logging and skipping any failure"""
+        try:
+            return self._process_file(file_path)
+        except Exception as e:
+            logger.error(f"Error processing {file_path}: {str(e)}")
+            return ""
+    
+    def _process_files_parallel(self, file_paths: List[Path], workers: int) -> List[str]:
+        """Process files in a process pool so one bad file only skips that file"""
+        contents = [""] * len(file_paths)
+        crashed = []
+        
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(self._process_file, file_path) for file_path in file_paths]
+            for i, future in enumerate(futures):
+                try:
+                    contents[i] = future.result()
+                except BrokenProcessPool:
+                    crashed.append(i)
+                except Exception as e:
+                    logger.error(f"Error processing {file_paths[i]}: {str(e)}")
+        
+        # A worker crash fails every pending file; retry each one in its own
+        # process so only the file that caused the crash is skipped
+        for i in crashed:
+            try:
+                with ProcessPoolExecutor(max_workers=1) as pool:
+                    contents[i] = pool.submit(self._process_file, file_paths[i]).result()
+            except Exception as e:
+                logger.error(f"Error processing {file_paths[i]}: {str(e)}")
+        
+        return contents
+    
     def load_from_url(self, url: str) -> List[Dict[str, Any]]:
         """Load documentation from a URL (basic web scraping)"""
         try:
-            response = requests.get(url, timeout=10)
+            response = http_session.get(url, timeout=10)
             response.raise_for_status()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            # Remove script and style elements
-            for script in soup(["script", "style"]):
-                script.decompose()
-                
-            # Get text content
-            text = soup.get_text()
-            
-            # Clean up whitespace
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            text = ' '.join(chunk for chunk in chunks if chunk)
-            
             return [{
-                'content': text,
+                'content': self._extract_html_text(response.content),
                 'source': url,
                 'type': 'web'
             }]
@@ -85,6 +153,51 @@ class DocumentProcessor:
             logger.error(f"Error loading from URL {url}: {str(e)}")
             return []
     
+    async def load_from_urls(self, urls: List[str]) -> List[Dict[str, Any]]:
+        """Load documentation from several URLs concurrently"""
+        if not aiohttp:
+            logger.warning("aiohttp not installed. Loading URLs sequentially.")
+            return [doc for url in urls for doc in self.load_from_url(url)]
+        
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+        
+        async def fetch(session, url: str) -> List[Dict[str, Any]]:
+            try:
+                async with semaphore:
+                    async with session.get(url) as response:
+                        response.raise_for_status()
+                        content = await response.read()
+                
+                # Parse in a worker thread so parsing overlaps other downloads
+                text = await loop.run_in_executor(None, self._extract_html_text, content)
+                return [{
+                    'content': text,
+                    'source': url,
+                    'type': 'web'
+                }]
+                
+            except Exception as e:
+                logger.error(f"Error loading from URL {url}: {str(e)}")
+                return []
+        
+        timeout = aiohttp.ClientTimeout(total=10)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            results = await asyncio.gather(*(fetch(session, url) for url in urls))
+        
+        return [doc for docs in results for doc in docs]
+    
+    def _extract_html_text(self, html: bytes) -> str:
+        """Extract visible text from an HTML page"""
+        soup = BeautifulSoup(html, HTML_PARSER)
+        
+        # Remove script and style elements
+        for script in soup(["script", "style"]):
+            script.decompose()
+            
+        # Get text content and collapse whitespace
+        return WHITESPACE_RE.sub(' ', soup.get_text()).strip()
+    
     def load_uploaded_files(self, uploaded_files) -> List[Dict[str, Any]]:
         """Process uploaded files from Streamlit"""
         documents = []
@@ -126,6 +239,8 @@ class DocumentProcessor:
         
         try:
             if extension in ['.txt', '.md']:
+                if file_path.stat().st_size > MMAP_THRESHOLD:
+                    return self._read_text_mmap(file_path)
                 with open(file_path, 'r', encoding='utf-8') as f:
                     return f.read()
             elif extension == '.pdf' and PyPDF2:
@@ -138,6 +253,17 @@ class DocumentProcessor:
             
         return ""
     
+    def _read_text_mmap(self, file_path: Path) -> str:
+        """Read a large UTF-8 text file by decoding straight from a memory map"""
+        with open(file_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                content = str(mm, 'utf-8')
+        
+        # Match the newline translation done by text-mode open()
+        if '\r' in content:
+            content = content.replace('\r\n', '\n').replace('\r', '\n')
+        return content
+    
     def _extract_pdf_content(self, file_obj) -> str:
         """Extract text content from PDF"""
         if not PyPDF2:
@@ -146,10 +272,7 @@ class DocumentProcessor:
             
         try:
             reader = PyPDF2.PdfReader(file_obj)
-            text = ""
-            for page in reader.pages:
-                text += page.extract_text() + "\n"
-            return text
+            return "\n".join(page.extract_text() or "" for page in reader.pages)
         except Exception as e:
             logger.error(f"Error extracting PDF content: {str(e)}")
             return ""
@@ -162,50 +285,57 @@ class DocumentProcessor:
             
         try:
             doc = DocxDocument(file_obj)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text
+            return "\n".join(paragraph.text for paragraph in doc.paragraphs)
         except Exception as e:
             logger.error(f"Error extracting DOCX content: {str(e)}")
             return ""
     
-    def chunk_document(self, document: Dict[str, Any], chunk_size: int = 1000, overlap: int = 200) -> List[Dict[str, Any]]:
+    def chunk_document(self, document: Dict[str, Any], chunk_size: int = 1000, overlap: int = 200) -> ChunkBatch:
         """Split document into chunks for embedding"""
         content = document['content']
-        chunks = []
+        texts = []
+        start_positions = []
+        end_positions = []
+        
+        # Precompute sentence/paragraph break positions once. UTF-32 gives one
+        # code unit per character, so indices match string offsets.
+        codepoints = np.frombuffer(content.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        periods = np.flatnonzero(codepoints == ord('.'))
+        newlines = np.flatnonzero(codepoints == ord('\n'))
         
-        # Simple text chunking
         start = 0
-        chunk_id = 0
         
         while start < len(content):
             end = start + chunk_size
-            chunk_text = content[start:end]
             
             # Try to end on a sentence or paragraph
             if end < len(content):
-                last_period = chunk_text.rfind('.')
-                last_newline = chunk_text.rfind('\n')
+                last_period = self._last_break_before(periods, end) - start
+                last_newline = self._last_break_before(newlines, end) - start
                 
                 if last_period > chunk_size * 0.7:  # If we find a period in the last 30%
                     end = start + last_period + 1
-                    chunk_text = content[start:end]
                 elif last_newline > chunk_size * 0.7:  # If we find a newline in the last 30%
                     end = start + last_newline + 1
-                    chunk_text = content[start:end]
             
-            chunks.append({
-                'content': chunk_text.strip(),
-                'source': document['source'],
-                'type': document['type'],
-                'chunk_id': chunk_id,
-                'start_pos': start,
-                'end_pos': end
-            })
+            texts.append(content[start:end].strip())
+            start_positions.append(start)
+            end_positions.append(end)
             
-            chunk_id += 1
             start = end - overlap  # Overlap chunks
-            
-        return chunks
+        
+        return ChunkBatch(
+            texts=texts,
+            sources=[document['source']] * len(texts),
+            types=[document['type']] * len(texts),
+            chunk_ids=list(range(len(texts))),
+            start_pos=start_positions,
+            end_pos=end_positions
+        )
+    
+    @staticmethod
+    def _last_break_before(positions: np.ndarray, end: int) -> int:
+        """Return the last break position before end, or -1 if there is none"""
+        index = np.searchsorted(positions, end) - 1
+        return int(positions[index]) if index >= 0 else -1
 
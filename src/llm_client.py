@@ -4,13 +4,22 @@ Handles communication with Ollama local LLM
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from typing import List, Dict, Any, Optional, Iterator
 import ollama
 import json
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Models whose connection check has succeeded in this process, shared by
+# all clients so each Streamlit session does not repeat the probe. Each model
+# has its own lock so concurrent sessions wait for an in-flight check or pull.
+_checked_models = set()
+_model_check_locks: Dict[str, threading.Lock] = {}
+_model_check_locks_guard = threading.Lock()
+
 
 class OllamaClient:
     """Client for interacting with Ollama LLM"""
@@ -29,20 +38,42 @@ Instructions:
 - Always be helpful and informative
 - If you don't know something, say so honestly
 - Format your responses in a user-friendly way with proper markdown when helpful
-
-Context: {context}
+"""
+        self.user_prompt_template = """Context: {context}
 
 User Question: {question}
 """
+        # Persistent chat session: a pinned system message followed by
+        # alternating user/assistant turns, so Ollama can reuse the KV cache
+        # for the unchanged prefix. History stores plain questions; retrieved
+        # context is only sent with the current turn.
+        self.messages: List[Dict[str, str]] = []
+        self.max_history_turns = 5
+        self.max_history_chars = 4000
+        self._system_key = None
+        
+        self.generation_options = {
+            'temperature': 0.7,
+            'top_p': 0.9,
+            'max_tokens': 1000
+        }
+        
+        self._warm_model = None
+        
+        # Short-timeout client for quick probes; generation keeps the default
+        # client since responses can take much longer than the probe timeout
+        self._probe_client = ollama.Client(timeout=2.0)
         
-        # Test connection to Ollama
-        self._test_connection()
+        # Model list is cached for a short time to avoid an HTTP call per rerun
+        self.models_cache_ttl = 60.0
+        self._models_cache: Optional[List[str]] = None
+        self._models_cache_time = 0.0
     
     def _test_connection(self) -> bool:
         """Test connection to Ollama service"""
         try:
             # Try to list available models
-            models = ollama.list()
+            models = self._probe_client.list()
             logger.info(f"Connected to Ollama. Available models: {len(models['models'])}")
             
             # Check if our model is available
@@ -53,6 +84,7 @@ User Question: {question}
                 logger.info(f"Attempting to pull model: {self.model_name}")
                 try:
                     ollama.pull(self.model_name)
+                    self._models_cache = None
                     logger.info(f"Successfully pulled model: {self.model_name}")
                 except Exception as e:
                     logger.error(f"Failed to pull model {self.model_name}: {str(e)}")
@@ -64,6 +96,97 @@ User Question: {question}
             logger.error(f"Failed to connect to Ollama: {str(e)}")
             return False
     
+    def _ensure_connection(self):
+        """Test the connection (and pull the model if needed) until it succeeds once per process"""
+        model_name = self.model_name
+        if model_name in _checked_models:
+            return
+        
+        with _model_check_locks_guard:
+            model_lock = _model_check_locks.setdefault(model_name, threading.Lock())
+        
+        with model_lock:
+            # Another session may have finished the check while we waited
+            if model_name in _checked_models:
+                return
+            if self._test_connection():
+                _checked_models.add(model_name)
+    
+    def warm_up(self) -> bool:
+        """Load the active model into memory ahead of the first real request"""
+        if self._warm_model == self.model_name:
+            return True
+        
+        self._ensure_connection()
+        try:
+            ollama.generate(model=self.model_name, prompt='', options={'num_predict': 1})
+            self._warm_model = self.model_name
+            logger.info(f"Warmed up model: {self.model_name}")
+            return True
+        except Exception as e:
+            logger.warning(f"Failed to warm up model {self.model_name}: {str(e)}")
+            return False
+    
+    def _build_messages(
+        self,
+        question: str,
+        context: List[Dict[str, Any]] = None,
+        project_name: str = "this project",
+        project_description: str = "An open-source project."
+    ) -> List[Dict[str, str]]:
+        """Build the chat messages for a question, reusing the pinned system prompt"""
+        # Start a new session when the project settings change
+        system_key = (project_name, project_description)
+        if system_key != self._system_key:
+            self.messages = [{
+                'role': 'system',
+                'content': self.system_prompt_template.format(
+                    project_name=project_name,
+                    project_description=project_description
+                )
+            }]
+            self._system_key = system_key
+        
+        # Prepare context string
+        context_str = ""
+        if context:
+            context_str = "\n\n".join([
+                f"Document: {doc['metadata']['source']}\nContent: {doc['content']}..."
+                for doc in context[:3]  # Use top 3 most relevant documents
+            ])
+            if not context_str:
+                context_str = "No specific documentation context available."
+        else:
+            context_str = "No documentation loaded yet."
+        
+        user_message = {
+            'role': 'user',
+            'content': self.user_prompt_template.format(
+                context=context_str,
+                question=question
+            )
+        }
+        return self.messages + [user_message]
+    
+    def _record_turn(self, question: str, answer: str):
+        """Append a completed turn to the session, keeping the latest turns"""
+        history = self.messages[1:] + [
+            {'role': 'user', 'content': question},
+            {'role': 'assistant', 'content': answer}
+        ]
+        history = history[-2 * self.max_history_turns:]
+        
+        # Drop the oldest turns until the history fits the size budget
+        while history and sum(len(message['content']) for message in history) > self.max_history_chars:
+            history = history[2:]
+        
+        self.messages = self.messages[:1] + history
+    
+    def reset_conversation(self):
+        """Forget previous turns (the system prompt is rebuilt on the next call)"""
+        self.messages = []
+        self._system_key = None
+    
     def generate_response(
         self, 
         question: str, 
@@ -72,54 +195,79 @@ User Question: {question}
         project_description: str = "An open-source project."
     ) -> str:
         """Generate response using Ollama"""
+        self._ensure_connection()
         try:
-            # Prepare context string
-            context_str = ""
-            if context:
-                context_str = "\n\n".join([
-                    f"Document: {doc['metadata']['source']}\nContent: {doc['content'][:500]}..."
-                    for doc in context[:3]  # Use top 3 most relevant documents
-                ])
-                if not context_str:
-                    context_str = "No specific documentation context available."
-            else:
-                context_str = "No documentation loaded yet."
-            
-            # Create the prompt
-            prompt = self.system_prompt_template.format(
-                project_name=project_name,
-                project_description=project_description,
-                context=context_str,
-                question=question
-            )
+            messages = self._build_messages(question, context, project_name, project_description)
             
             logger.info(f"Generating response for question: {question[:50]}...")
             
             # Generate response
-            response = ollama.generate(
+            response = ollama.chat(
                 model=self.model_name,
-                prompt=prompt,
-                options={
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'max_tokens': 1000
-                }
+                messages=messages,
+                options=self.generation_options
             )
             
-            answer = response['response'].strip()
+            answer = response['message']['content'].strip()
+            self._record_turn(question, answer)
             logger.info("Successfully generated response")
             
             return answer
             
         except Exception as e:
             logger.error(f"Error generating response: {str(e)}")
-            return f"I apologize, but I encountered an error while processing your question. Please make sure Ollama is running and the model '{self.model_name}' is available. Error: {str(e)}"
+            return self._error_message(e)
+    
+    def generate_response_stream(
+        self,
+        question: str,
+        context: List[Dict[str, Any]] = None,
+        project_name: str = "this project",
+        project_description: str = "An open-source project."
+    ) -> Iterator[str]:
+        """Generate response using Ollama, yielding text as it is produced"""
+        self._ensure_connection()
+        try:
+            messages = self._build_messages(question, context, project_name, project_description)
+            
+            logger.info(f"Streaming response for question: {question[:50]}...")
+            
+            parts = []
+            for chunk in ollama.chat(
+                model=self.model_name,
+                messages=messages,
+                stream=True,
+                options=self.generation_options
+            ):
+                text = chunk['message']['content']
+                parts.append(text)
+                yield text
+            
+            self._record_turn(question, "".join(parts).strip())
+            logger.info("Successfully generated response")
+            
+        except Exception as e:
+            logger.error(f"Error generating response: {str(e)}")
+            yield self._error_message(e)
+    
+    def _error_message(self, error: Exception) -> str:
+        """User-facing message for a failed generation"""
+        return f"I apologize, but I encountered an error while processing your question. Please make sure Ollama is running and the model '{self.model_name}' is available. Error: {str(error)}"
     
-    def get_available_models(self) -> List[str]:
-        """Get list of available Ollama models"""
+    def get_available_models(self, refresh: bool = False) -> List[str]:
+        """Get list of available Ollama models (cached for models_cache_ttl seconds)"""
+        if (
+            not refresh
+            and self._models_cache is not None
+            and time.monotonic() - self._models_cache_time < self.models_cache_ttl
+        ):
+            return list(self._models_cache)
+        
         try:
-            models = ollama.list()
-            return [model['name'] for model in models['models']]
+            models = self._probe_client.list()
+            self._models_cache = [model['name'] for model in models['models']]
+            self._models_cache_time = time.monotonic()
+            return list(self._models_cache)
         except Exception as e:
             logger.error(f"Error getting available models: {str(e)}")
             return []
@@ -134,6 +282,7 @@ User Question: {question}
                 ollama.pull(model_name)
             
             self.model_name = model_name
+            self._models_cache = None  # A pull may have added a model
             logger.info(f"Successfully switched to model: {model_name}")
             return True
             
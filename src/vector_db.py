@@ -5,25 +5,59 @@ Handles embedding storage and retrieval using ChromaDB
 
 import os
 import logging
+import functools
+import hashlib
+import queue
+import threading
 from typing import List, Dict, Any, Optional
+import numpy as np
 import chromadb
 from chromadb.config import Settings
 from sentence_transformers import SentenceTransformer
+import torch
+
+from .chunk_batch import ChunkBatch
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+ADD_BATCH_SIZE = 64
+EMBEDDING_DEVICE = 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def load_embedding_model() -> SentenceTransformer:
+    """Load the embedding model, using FP16 on GPU when available"""
+    model = SentenceTransformer(EMBEDDING_MODEL_NAME, device=EMBEDDING_DEVICE)
+    if EMBEDDING_DEVICE == 'cuda':
+        model.half()
+        logger.info("Loaded embedding model on CUDA (FP16)")
+    return model
+
+
+def create_chroma_client(persist_directory: str = "./embeddings"):
+    """Create a persistent ChromaDB client for the given directory"""
+    os.makedirs(persist_directory, exist_ok=True)
+    return chromadb.PersistentClient(path=persist_directory)
+
 
 class VectorDatabase:
     """Manages vector embeddings and similarity search"""
     
-    def __init__(self, persist_directory: str = "./embeddings"):
+    def __init__(
+        self,
+        persist_directory: str = "./embeddings",
+        embedding_model: Optional[SentenceTransformer] = None,
+        client=None
+    ):
         self.persist_directory = persist_directory
-        self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+        # Model and client can be injected so callers can share them across instances
+        self.embedding_model = embedding_model or load_embedding_model()
+        # Memoize query embeddings per instance (sample questions repeat often)
+        self._embed_query = functools.lru_cache(maxsize=512)(self._embed_query)
         
         # Initialize ChromaDB
-        os.makedirs(persist_directory, exist_ok=True)
-        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.client = client or create_chroma_client(persist_directory)
         
         # Get or create collection
         self.collection_name = "documentation"
@@ -33,47 +67,159 @@ class VectorDatabase:
         except ValueError:
             self.collection = self.client.create_collection(
                 name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
+                metadata={"hnsw:space": "ip"}  # Embeddings are pre-normalized
             )
             logger.info(f"Created new collection: {self.collection_name}")
     
-    def add_documents(self, documents: List[Dict[str, Any]]) -> bool:
-        """Add documents to the vector database"""
+    def _encode(self, texts: List[str]):
+        """Encode texts into normalized embeddings"""
+        # Kept as float32: ChromaDB 0.4 stores embeddings as float32, so
+        # quantizing to float16 here would lose precision without saving space
+        return self.embedding_model.encode(
+            texts,
+            batch_size=ADD_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+    
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        """Token count of each text as seen by the model (after truncation)"""
+        try:
+            encoded = self.embedding_model.tokenizer(
+                texts,
+                truncation=True,
+                max_length=self.embedding_model.max_seq_length,
+                return_length=True
+            )
+            return list(encoded['length'])
+        except Exception as e:
+            logger.warning(f"Falling back to character lengths for batching: {str(e)}")
+            return [len(text) for text in texts]
+    
+    def _embed_query(self, query: str) -> np.ndarray:
+        """Embed a single query as a read-only float32 vector so it can be cached"""
+        embedding = np.ascontiguousarray(self._encode([query])[0], dtype=np.float32)
+        embedding.setflags(write=False)
+        return embedding
+    
+    def add_documents(self, chunks: ChunkBatch) -> bool:
+        """Add document chunks to the vector database"""
         try:
-            texts = [doc['content'] for doc in documents]
-            metadatas = [{
-                'source': doc['source'],
-                'type': doc.get('type', 'unknown'),
-                'chunk_id': doc.get('chunk_id', 0)
-            } for doc in documents]
+            texts = chunks.texts
             
-            # Generate embeddings
-            logger.info(f"Generating embeddings for {len(texts)} documents...")
-            embeddings = self.embedding_model.encode(texts).tolist()
+            # Skip chunks whose text was already seen in this call
+            seen_hashes = set()
+            hashes = []
+            unique_indices = []
+            for i, text in enumerate(texts):
+                content_hash = hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+                hashes.append(content_hash)
+                if content_hash not in seen_hashes:
+                    seen_hashes.add(content_hash)
+                    unique_indices.append(i)
             
-            # Create unique IDs
-            ids = [f"{doc['source']}_{doc.get('chunk_id', 0)}" for doc in documents]
+            # Sort by token length so each batch pads to a similar sequence length
+            token_lengths = self._token_lengths([texts[i] for i in unique_indices])
+            unique_indices = [i for _, i in sorted(zip(token_lengths, unique_indices))]
             
-            # Add to collection
-            self.collection.add(
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadatas,
-                ids=ids
+            if len(unique_indices) < len(chunks):
+                logger.info(f"Skipped {len(chunks) - len(unique_indices)} duplicate chunks")
+            logger.info(f"Generating embeddings for {len(unique_indices)} documents...")
+            
+            # Embed batches on this thread while a writer thread adds the
+            # previous batch to the collection
+            write_queue = queue.Queue(maxsize=2)
+            write_errors = []
+            writer = threading.Thread(
+                target=self._write_batches,
+                args=(write_queue, write_errors),
+                daemon=True
             )
+            writer.start()
+            
+            queued_count = 0
+            try:
+                # Embed and persist in fixed-size batches to cap peak memory
+                for start in range(0, len(unique_indices), ADD_BATCH_SIZE):
+                    if write_errors:
+                        break
+                    batch = unique_indices[start:start + ADD_BATCH_SIZE]
+                    
+                    # Create unique IDs and skip chunks that are already persisted,
+                    # either under the current IDs or the older source_chunkid IDs
+                    ids = [f"{chunks.sources[i]}_{chunks.chunk_ids[i]}_{hashes[i]}" for i in batch]
+                    legacy_ids = [f"{chunks.sources[i]}_{chunks.chunk_ids[i]}" for i in batch]
+                    existing_ids = set(self.collection.get(ids=ids + legacy_ids, include=[])['ids'])
+                    if existing_ids:
+                        kept = [
+                            (i, doc_id) for i, doc_id, legacy_id in zip(batch, ids, legacy_ids)
+                            if doc_id not in existing_ids and legacy_id not in existing_ids
+                        ]
+                        batch = [i for i, _ in kept]
+                        ids = [doc_id for _, doc_id in kept]
+                    if not batch:
+                        continue
+                    
+                    batch_texts = [texts[i] for i in batch]
+                    metadatas = [{
+                        'source': chunks.sources[i],
+                        'type': chunks.types[i],
+                        'chunk_id': chunks.chunk_ids[i]
+                    } for i in batch]
+                    
+                    # Generate embeddings
+                    embeddings = self._encode(batch_texts).tolist()
+                    
+                    write_queue.put((ids, embeddings, batch_texts, metadatas))
+                    queued_count += len(ids)
+            finally:
+                write_queue.put(None)
+                writer.join()
             
-            logger.info(f"Successfully added {len(documents)} documents to vector database")
+            if write_errors:
+                raise write_errors[0]
+            
+            logger.info(
+                f"Successfully added {queued_count} documents to vector database "
+                f"({len(unique_indices) - queued_count} already stored)"
+            )
             return True
             
         except Exception as e:
             logger.error(f"Error adding documents to vector database: {str(e)}")
             return False
     
-    def search(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
-        """Search for similar documents"""
+    def _write_batches(self, write_queue: queue.Queue, write_errors: List[Exception]):
+        """Add queued batches to the collection until a None sentinel arrives"""
+        while True:
+            item = write_queue.get()
+            if item is None:
+                return
+            if write_errors:
+                continue  # Keep draining so the producer never blocks
+            
+            ids, embeddings, texts, metadatas = item
+            try:
+                self.collection.add(
+                    embeddings=embeddings,
+                    documents=texts,
+                    metadatas=metadatas,
+                    ids=ids
+                )
+            except Exception as e:
+                write_errors.append(e)
+    
+    def search(
+        self,
+        query: str,
+        n_results: int = 5,
+        max_content_length: Optional[int] = 500
+    ) -> List[Dict[str, Any]]:
+        """Search for similar documents, truncating content to max_content_length (None keeps it whole)"""
         try:
             # Generate query embedding
-            query_embedding = self.embedding_model.encode([query]).tolist()
+            query_embedding = [self._embed_query(query).tolist()]
             
             # Search collection
             results = self.collection.query(
@@ -82,15 +228,18 @@ class VectorDatabase:
                 include=['documents', 'metadatas', 'distances']
             )
             
-            # Format results
-            formatted_results = []
-            for i in range(len(results['documents'][0])):
-                formatted_results.append({
-                    'content': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i],
-                    'relevance_score': 1 - results['distances'][0][i]  # Convert distance to similarity
-                })
+            # Format results. Chroma's ip distance is 1 - dot product, so on
+            # normalized embeddings 1 - distance is the cosine similarity.
+            formatted_results = [{
+                'content': content[:max_content_length],
+                'metadata': metadata,
+                'distance': distance,
+                'relevance_score': 1 - distance
+            } for content, metadata, distance in zip(
+                results['documents'][0],
+                results['metadatas'][0],
+                results['distances'][0]
+            )]
             
             logger.info(f"Found {len(formatted_results)} similar documents for query")
             return formatted_results
@@ -106,7 +255,7 @@ class VectorDatabase:
             return {
                 'document_count': count,
                 'collection_name': self.collection_name,
-                'embedding_model': 'all-MiniLM-L6-v2'
+                'embedding_model': EMBEDDING_MODEL_NAME
             }
         except Exception as e:
             logger.error(f"Error getting collection info: {str(e)}")
@@ -119,7 +268,7 @@ class VectorDatabase:
             self.client.delete_collection(self.collection_name)
             self.collection = self.client.create_collection(
                 name=self.collection_name,
-                metadata={"hnsw:space": "cosine"}
+                metadata={"hnsw:space": "ip"}  # Embeddings are pre-normalized
             )
             logger.info("Successfully cleared vector database")
             return True